@@ -1,53 +1,72 @@
+import asyncio
 from enum import Enum
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List
-from pydantic import BaseModel
-import uuid
+from starlette.websockets import WebSocketState
+from contextlib import asynccontextmanager
+from typing import Dict, List, NamedTuple, Union
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+import secrets
 import uvicorn
 from datetime import datetime
+import atexit
 import logging
+import logging.handlers
+import queue
+import orjson
 import sys
-import websockets
+import time
+import zlib
+from websockets.exceptions import ConnectionClosed
 
 # 로깅 설정: 모든 이벤트에 타임스탬프 포함
+# 파일/콘솔 쓰기는 QueueListener의 백그라운드 스레드에서 처리하여
+# 디스크 I/O가 이벤트 루프를 막지 않도록 함
+log_queue = queue.Queue(-1)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s.%(msecs)03d %(levelname)s: %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S',
-    handlers=[
-        logging.FileHandler('game_server.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
+    handlers=[logging.handlers.QueueHandler(log_queue)]
 )
+log_listener = logging.handlers.QueueListener(
+    log_queue,
+    logging.FileHandler('game_server.log'),
+    logging.StreamHandler(sys.stdout)
+)
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """서버 실행 동안 빈 방 정리 작업을 함께 실행"""
+    cleanup_task = asyncio.create_task(_cleanup_rooms())
+    yield
+    cleanup_task.cancel()
+
 # FastAPI 애플리케이션 초기화
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS 설정
-# 개발 환경과 프로덕션 환경 모두에서 웹소켓 연결을 허용하기 위해
-# http, https, ws, wss 프로토콜을 모두 허용
+# Origin 헤더는 페이지의 http/https 스킴을 사용하므로 (WebSocket 연결 포함)
+# ws, wss 스킴은 목록에 넣지 않음
 origins = [
     "http://localhost:3000",     # Next.js dev server
     "https://localhost:3000",
-    "ws://localhost:3000",       # WebSocket connections
-    "wss://localhost:3000",
     "http://localhost:8000",     # FastAPI dev server
     "https://localhost:8000",
-    "ws://localhost:8000",
-    "wss://localhost:8000",
-    "https://your-production-domain.com",
-    "wss://your-production-domain.com"
+    "https://your-production-domain.com"
 ]
 
 # Add CORS middleware with specific configuration
+# 실제 사용하는 메서드/헤더만 허용하여 preflight 요청마다 요청 헤더를 그대로 반영하지 않도록 함
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PATCH", "OPTIONS"],
+    allow_headers=["content-type", "authorization"],
 )
 
 # PlayerCountType: 게임 모드별 참가자 수를 정의하는 열거형
@@ -96,16 +115,309 @@ class LobbyStatus(BaseModel):
     currentSet: int
     allReady: bool
 
+# Define the nested teamData object of the update_team payload
+class TeamData(BaseModel):
+    team: str  # "BLUE" | "RED" | "SPECTATOR"
+    position: int
+
+# Define the WebSocket update_team payload model
+class UpdateTeamData(BaseModel):
+    userId: str
+    teamData: TeamData
+
+# Define the WebSocket update_ready payload model
+class ReadyData(BaseModel):
+    userId: str
+    isReady: bool
+
+# 챔피언 이름 최대 길이
+MAX_CHAMPION_NAME_LENGTH = 32
+
+# Define the WebSocket ban/pick payload model
+class DraftActionData(BaseModel):
+    champion: str = Field(min_length=1, max_length=MAX_CHAMPION_NAME_LENGTH)
+
+# WebSocket 메시지 검증기
+# 메시지마다 모델을 새로 준비하지 않도록 모듈 로드 시 한 번만 생성
+_UPDATE_TEAM_ADAPTER = TypeAdapter(UpdateTeamData)
+_READY_DATA_ADAPTER = TypeAdapter(ReadyData)
+_DRAFT_ACTION_ADAPTER = TypeAdapter(DraftActionData)
+
 # 전역 상태 저장소
 # rooms: 게임 방들의 상태를 저장
-# - key: 방 ID (8자리 UUID)
+# - key: 방 ID (8자리 16진수)
 # - value: 방 상태 정보 (설정, 참가자, 현재 상태 등)
 rooms: Dict[str, Dict[str, any]] = {}
 
+# 클라이언트에 공개하는 방 상태 키 (GET /game/{game_code} 응답)
+# 나머지 키는 서버 내부에서만 사용
+PUBLIC_ROOM_KEYS = ["bans", "picks", "settings", "status", "participants", "spectators", "currentSet", "results", "users"]
+
+# 빈 방 정리 주기 (초)
+ROOM_CLEANUP_INTERVAL = 60
+
+# 사용자와 연결이 모두 없는 방을 유지하는 시간 (초)
+EMPTY_ROOM_TIMEOUT = 600
+
+# 방 최대 유지 시간 (초): 생성 후 이 시간이 지나면 사용 중이어도 삭제
+ROOM_TTL = 24 * 3600
+
+# 최대 방 개수: 초과 시 가장 오래된 방부터 삭제
+MAX_ROOMS = 10_000
+
+# 방 삭제로 연결을 끊을 때의 종료 코드 (1001: Going Away)
+ROOM_CLOSED_CLOSE_CODE = 1001
+
+# 세트당 최대 밴/픽 수 (양 팀 합계)
+MAX_BANS_PER_SET = 10
+MAX_PICKS_PER_SET = 10
+
+# 클라이언트별 송신 큐 크기
+# 큐가 가득 찰 만큼 뒤처진 클라이언트는 연결을 끊음
+CLIENT_QUEUE_SIZE = 32
+
+# 뒤처진 클라이언트 연결 종료 코드 (1013: Try Again Later)
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+# 같은 사용자가 다시 접속하여 이전 연결을 끊을 때의 종료 코드 (1008: Policy Violation)
+REPLACED_CLIENT_CLOSE_CODE = 1008
+
+# 브로드캐스트 지연 시간 (초)
+# 이 시간 안에 연속으로 발생한 상태 변경은 한 번의 브로드캐스트로 합쳐짐
+BROADCAST_DELAY = 0.01
+
+# 압축 전송을 요청하는 WebSocket 서브프로토콜
+# 이 서브프로토콜로 접속한 클라이언트에게는 큰 메시지를 zlib으로 압축한 바이너리 프레임으로 전송
+COMPRESSION_SUBPROTOCOL = "gpb-zlib"
+
+# 압축 기준 크기 (바이트): 이보다 작은 메시지는 압축 이득이 없으므로 텍스트 프레임으로 전송
+COMPRESSION_THRESHOLD = 512
+
+# ClientConnection: 연결된 클라이언트 하나의 송신 상태
+# - websocket: 클라이언트 WebSocket 연결
+# - queue: 전송 대기 중인 직렬화된 메시지 (str: 텍스트 프레임, bytes: 압축된 바이너리 프레임)
+# - writer: queue를 비우며 websocket으로 전송하는 작업
+# - compressed: 압축 서브프로토콜로 접속했는지 여부
+class ClientConnection(NamedTuple):
+    websocket: WebSocket
+    queue: asyncio.Queue
+    writer: asyncio.Task
+    compressed: bool
+
 # WebSocket 연결 저장소
 # - key: 방 ID
-# - value: Dictionary of client_id to WebSocket connection
-connected_clients: Dict[str, Dict[str, WebSocket]] = {}
+# - value: Dictionary of client_id to ClientConnection
+connected_clients: Dict[str, Dict[str, ClientConnection]] = {}
+
+# 예약된 브로드캐스트 작업 저장소
+# - key: 방 ID
+# - value: 대기 중인 브로드캐스트 작업 (방마다 최대 하나)
+broadcast_tasks: Dict[str, asyncio.Task] = {}
+
+# 종료 중인 WebSocket close 작업 (완료 전에 GC되지 않도록 참조 유지)
+closing_tasks = set()
+
+# 액션별 확인 응답 페이로드 (메시지마다 다시 직렬화하지 않도록 미리 생성)
+# - key: (액션, 처리 성공 여부)
+_ACK_PAYLOADS = {
+    (action, ok): orjson.dumps({"type": "ack", "ok": ok, "action": action}).decode()
+    for action in ["ban", "pick", "update_team", "update_ready", "resync"]
+    for ok in [True, False]
+}
+
+# 알 수 없는 액션/잘못된 메시지에 대한 확인 응답 (클라이언트가 보낸 값을 그대로 돌려보내지 않음)
+_UNKNOWN_ACK_PAYLOAD = orjson.dumps({"type": "ack", "ok": False, "action": None}).decode()
+
+def ack_payload(action, ok: bool):
+    """액션 확인 응답 페이로드 (미리 직렬화된 문자열만 사용)"""
+    if not isinstance(action, str):
+        return _UNKNOWN_ACK_PAYLOAD
+    return _ACK_PAYLOADS.get((action, ok), _UNKNOWN_ACK_PAYLOAD)
+
+# 전송 중 연결이 끊겼을 때 발생하는 예외
+# - WebSocketDisconnect: Starlette가 소켓 오류를 변환한 경우
+# - ConnectionClosed: websockets 구현에서 연결이 닫힌 경우
+# - OSError: 전송 계층 오류 (uvicorn ClientDisconnected 포함)
+SEND_ERRORS = (WebSocketDisconnect, ConnectionClosed, OSError)
+
+def enqueue_message(game_code: str, client_id: str, connection: ClientConnection, payload: Union[str, bytes]):
+    """
+    클라이언트 송신 큐에 메시지를 넣음 (대기하지 않음)
+
+    큐가 가득 찬 느린 클라이언트는 브로드캐스트를 기다리게 하지 않고 연결을 끊음
+    (다시 접속하면 websocket_endpoint가 접속 직후 현재 status_update와 드래프트 상태를 전송)
+    """
+    try:
+        connection.queue.put_nowait(payload)
+    except asyncio.QueueFull:
+        logger.warning("Send queue full for client %s in room %s, closing connection", client_id, game_code)
+        drop_client(game_code, client_id, connection.websocket)
+        close_websocket_later(connection.websocket, SLOW_CLIENT_CLOSE_CODE)
+
+def close_websocket_later(websocket: WebSocket, code: int):
+    """호출한 쪽이 기다리지 않도록 백그라운드 작업으로 WebSocket 연결을 닫음"""
+    close_task = asyncio.create_task(_close_websocket(websocket, code))
+    closing_tasks.add(close_task)
+    close_task.add_done_callback(closing_tasks.discard)
+
+async def _close_websocket(websocket: WebSocket, code: int):
+    try:
+        await websocket.close(code=code)
+    except (RuntimeError, *SEND_ERRORS):
+        # 이미 닫힌 연결
+        pass
+
+async def client_writer(game_code: str, client_id: str, websocket: WebSocket, send_queue: asyncio.Queue):
+    """
+    클라이언트 송신 큐를 비우며 메시지를 전송하는 작업
+
+    연결이 끊겨 전송에 실패하면 해당 연결을 connected_clients에서 제거하고 종료
+    (CancelledError 등 다른 예외는 그대로 전파)
+    """
+    try:
+        while True:
+            payload = await send_queue.get()
+            if isinstance(payload, bytes):
+                await websocket.send_bytes(payload)
+            else:
+                await websocket.send_text(payload)
+    except SEND_ERRORS as e:
+        logger.warning("Failed to send message to client %s in room %s: %s", client_id, game_code, e)
+        drop_client(game_code, client_id, websocket)
+
+def drop_client(game_code: str, client_id: str, websocket: WebSocket):
+    """
+    연결 정보를 connected_clients와 participants/spectators에서 제거
+
+    같은 사용자가 이미 다시 접속한 경우에는 새 연결을 건드리지 않음
+    """
+    clients = connected_clients.get(game_code)
+    if not clients:
+        return
+    connection = clients.get(client_id)
+    if connection is None or connection.websocket is not websocket:
+        return
+
+    del clients[client_id]
+    if not clients:
+        del connected_clients[game_code]
+    connection.writer.cancel()
+
+    room = rooms.get(game_code)
+    if room:
+        room["participants"].pop(client_id, None)
+        room["spectators"].pop(client_id, None)
+
+def remove_room(room_id: str):
+    """
+    방을 삭제하고 연결된 클라이언트의 송신 작업과 WebSocket 연결을 정리
+    """
+    for client_id, connection in list(connected_clients.get(room_id, {}).items()):
+        drop_client(room_id, client_id, connection.websocket)
+        close_websocket_later(connection.websocket, ROOM_CLOSED_CLOSE_CODE)
+    broadcast_task = broadcast_tasks.pop(room_id, None)
+    if broadcast_task:
+        broadcast_task.cancel()
+    rooms.pop(room_id, None)
+
+async def _cleanup_rooms():
+    """
+    주기적으로 방을 정리하는 작업
+
+    - 사용자와 WebSocket 연결이 모두 없는 상태로 EMPTY_ROOM_TIMEOUT이 지난 방을 삭제
+    - 생성 후 ROOM_TTL이 지난 방은 사용 중이어도 삭제
+    """
+    while True:
+        await asyncio.sleep(ROOM_CLEANUP_INTERVAL)
+        now = time.monotonic()
+        expired = [
+            room_id for room_id, room in rooms.items()
+            if now - room["created_at"] > ROOM_TTL
+            or (
+                not room["users"]
+                and room_id not in connected_clients
+                and now - room["created_at"] > EMPTY_ROOM_TIMEOUT
+            )
+        ]
+        for room_id in expired:
+            remove_room(room_id)
+        if expired:
+            logger.info("Removed %s expired rooms", len(expired))
+
+# 접속 시각 문자열 캐시 (1초에 한 번만 새로 포맷)
+_now_cache = {"ts": "", "t": 0.0}
+
+def now_iso():
+    """현재 시각의 ISO 문자열 (최대 1초 단위로 캐시)"""
+    t = time.time()
+    if t - _now_cache["t"] > 1.0:
+        _now_cache["ts"] = datetime.now().isoformat()
+        _now_cache["t"] = t
+    return _now_cache["ts"]
+
+def _is_unready(user: Dict[str, any]):
+    """준비 완료 여부 집계 대상인데 아직 준비되지 않은 사용자인지 (관전자/방장 제외)"""
+    return user["team"] != "SPECTATOR" and not (user["isReady"] or user["isHost"])
+
+def update_user(room: Dict[str, any], user: Dict[str, any], **fields):
+    """
+    사용자 정보를 변경하고 방의 unready_count를 함께 갱신
+
+    team/isReady를 바꿀 때는 항상 이 함수를 사용해야 allReady 계산이 맞게 유지됨
+    """
+    was_unready = _is_unready(user)
+    user.update(fields)
+    room["unready_count"] += _is_unready(user) - was_unready
+
+def refresh_status_template(room: Dict[str, any]):
+    """
+    방의 status_update 템플릿에서 바뀔 수 있는 값만 갱신하여 반환
+
+    settings/users는 방 생성 시 같은 객체를 공유하도록 넣어두었으므로 다시 채우지 않음
+    """
+    status_update = room["status_template"]
+    data = status_update["data"]
+    data["status"] = room["status"]
+    data["currentSet"] = room["currentSet"]
+    data["allReady"] = room["unready_count"] == 0
+    return status_update
+
+def apply_draft_action(room_id: str, room: Dict[str, any], op: str, champion: str, user_id: str) -> bool:
+    """
+    밴/픽을 방 상태에 반영하고 변경분(delta)만 방 전체에 전송
+
+    전체 방 상태 대신 이번 변경만 보내므로 드래프트가 진행되어도 메시지 크기가 일정함
+    클라이언트는 seq가 건너뛰면 resync 액션으로 전체 드래프트 상태를 다시 받음
+    이미 밴/픽된 챔피언이거나 이번 세트의 밴/픽 수가 가득 찼으면 반영하지 않고 False 반환
+    """
+    targets = room["bans" if op == "ban" else "picks"]
+    limit = MAX_BANS_PER_SET if op == "ban" else MAX_PICKS_PER_SET
+    if champion in room["bans"] or champion in room["picks"] or len(targets) >= limit:
+        return False
+    targets.append(champion)
+    room["seq"] += 1
+    # 세트 변경 status_update보다 delta가 먼저 도착해도 클라이언트가 세트를 판단할 수 있도록 currentSet 포함
+    delta = {"type": "delta", "seq": room["seq"], "currentSet": room["currentSet"], "op": op, "champion": champion, "by": user_id}
+    send_to_room(room_id, orjson.dumps(delta).decode())
+    return True
+
+def draft_snapshot_payload(room: Dict[str, any]):
+    """resync 요청에 대한 전체 드래프트 상태 (그 자리에서 직렬화)"""
+    return orjson.dumps({
+        "type": "resync",
+        "seq": room["seq"],
+        "bans": room["bans"],
+        "picks": room["picks"],
+        "status": room["status"],
+        "currentSet": room["currentSet"]
+    }).decode()
+
+def refresh_public_view(room: Dict[str, any]):
+    """방의 공개 상태 뷰에서 바뀔 수 있는 스칼라 값만 갱신하여 반환"""
+    public = room["public"]
+    public["status"] = room["status"]
+    public["currentSet"] = room["currentSet"]
+    return public
 
 async def broadcast_room_status(game_code: str):
     """
@@ -120,27 +432,77 @@ async def broadcast_room_status(game_code: str):
     if game_code not in rooms or game_code not in connected_clients:
         return
     
-    room = rooms[game_code]
-    all_ready = all(user["isReady"] or user["isHost"] for user in room["users"] if user["team"] != "SPECTATOR")
-    
-    status_update = {
-        "type": "status_update",
-        "data": LobbyStatus(
-            gameCode=game_code,
-            settings=GameSettings(**room["settings"]),
-            users=room["users"],
-            status=room["status"],
-            currentSet=room["currentSet"],
-            allReady=all_ready
-        ).model_dump()
-    }
+    status_update = refresh_status_template(rooms[game_code])
     
-    # 모든 연결된 클라이언트에게 상태 업데이트 전송
-    for websocket in connected_clients[game_code].values():
-        try:
-            await websocket.send_json(status_update)
-        except:
-            logger.warning(f"Failed to send status update to a client in room {game_code}")
+    # 페이로드는 한 번만 직렬화하고 모든 클라이언트가 같은 문자열을 공유
+    # 브라우저 클라이언트가 JSON.parse 할 수 있도록 텍스트 프레임으로 전송
+    send_to_room(game_code, orjson.dumps(status_update).decode())
+
+def send_to_room(game_code: str, payload: str):
+    """
+    직렬화된 메시지를 방의 모든 연결된 클라이언트 송신 큐에 넣음
+
+    실제 전송은 각 클라이언트의 writer 작업이 담당하므로
+    느린 클라이언트 하나가 다른 클라이언트의 전송을 막지 않음
+    압축을 요청한 클라이언트에게 보낼 큰 메시지는 한 번만 압축하여 모두에게 같은 버퍼를 전송
+    """
+    compressed_payload = None
+    # 이미 끊어진 연결은 전송을 시도하지 않고 바로 제거
+    for client_id, connection in list(connected_clients.get(game_code, {}).items()):
+        if connection.websocket.client_state != WebSocketState.CONNECTED:
+            drop_client(game_code, client_id, connection.websocket)
+            continue
+        if connection.compressed:
+            if compressed_payload is None:
+                compressed_payload = compress_payload(payload)
+            enqueue_message(game_code, client_id, connection, compressed_payload)
+        else:
+            enqueue_message(game_code, client_id, connection, payload)
+
+def send_to_client(game_code: str, client_id: str, connection: ClientConnection, payload: str):
+    """직렬화된 메시지를 클라이언트 한 명의 송신 큐에 넣음 (압축을 요청한 클라이언트에게는 큰 메시지를 압축)"""
+    if connection.compressed:
+        payload = compress_payload(payload)
+    enqueue_message(game_code, client_id, connection, payload)
+
+def compress_payload(payload: str) -> Union[str, bytes]:
+    """COMPRESSION_THRESHOLD(바이트)보다 큰 메시지는 zlib으로 압축한 bytes로, 작은 메시지는 그대로 반환"""
+    data = payload.encode()
+    if len(data) > COMPRESSION_THRESHOLD:
+        return zlib.compress(data, 1)
+    return payload
+
+async def receive_message(websocket: WebSocket):
+    """
+    WebSocket 메시지를 받아 orjson으로 파싱
+
+    텍스트/바이너리 프레임 모두 지원하며, 연결이 끊기면 receive_json과 같이
+    WebSocketDisconnect를 발생시킴
+    """
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    if message.get("bytes") is not None:
+        return orjson.loads(message["bytes"])
+    return orjson.loads(message["text"])
+
+def schedule_broadcast(game_code: str):
+    """
+    방 상태 브로드캐스트를 예약
+
+    BROADCAST_DELAY 동안 발생한 상태 변경은 한 번의 브로드캐스트로 합쳐지며,
+    호출한 요청 처리기는 전송을 기다리지 않고 바로 응답
+    """
+    if game_code in broadcast_tasks:
+        return
+    broadcast_tasks[game_code] = asyncio.create_task(_flush_broadcast(game_code))
+
+async def _flush_broadcast(game_code: str):
+    try:
+        await asyncio.sleep(BROADCAST_DELAY)
+        await broadcast_room_status(game_code)
+    finally:
+        broadcast_tasks.pop(game_code, None)
 
 @app.post("/create-room")
 async def create_room(request: Request):
@@ -148,7 +510,7 @@ async def create_room(request: Request):
     새로운 게임 방을 생성
     
     1. 클라이언트로부터 받은 설정을 검증
-    2. 고유한 방 ID 생성 (8자리 UUID)
+    2. 고유한 방 ID 생성 (8자리 16진수)
     3. 초기 상태의 방 생성 (대기 상태)
     4. 방 정보를 전역 저장소에 저장
     """
@@ -157,55 +519,78 @@ async def create_room(request: Request):
     try:
         settings = GameSettings(**settings_data)
     except Exception as e:
-        logger.error(f"Invalid settings data: {e}")
+        logger.error("Invalid settings data: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     
-    room_id = str(uuid.uuid4())[:8]
-    rooms[room_id] = {
+    room_id = secrets.token_hex(4)
+    while room_id in rooms:  # 기존 방 덮어쓰기 방지
+        room_id = secrets.token_hex(4)
+    if len(rooms) >= MAX_ROOMS:
+        # rooms는 생성 순서를 유지하므로 첫 번째 키가 가장 오래된 방
+        oldest_room_id = next(iter(rooms))
+        logger.warning("Room limit reached, removing oldest room %s", oldest_room_id)
+        remove_room(oldest_room_id)
+    # JSON 모드로 한 번만 덤프하여 저장/로그/응답에서 그대로 재사용 (playerCount는 문자열)
+    settings_dump = settings.model_dump(mode="json")
+    users = []
+    room = rooms[room_id] = {
         "bans": [],
         "picks": [],
-        "settings": settings.model_dump(),  # Updated from dict()
+        "settings": settings_dump,
+        "is_solo": settings.playerCount == PlayerCountType.SOLO,  # 솔로 모드 여부 (WebSocket 미지원)
         "status": "waiting",
         "participants": {},  # Active game participants
         "spectators": {},    # Spectators
         "currentSet": 1,     # 현재 세트 번호
         "results": [],       # 각 세트의 게임 결과
-        "users": [],         # 로비 사용자 목록
+        "users": users,      # 로비 사용자 목록
+        "users_by_id": {},   # 사용자 ID -> users 항목 (같은 dict 객체를 공유)
+        "created_at": time.monotonic(),  # 빈 방 정리 기준 시각
+        "unready_count": 0,  # 준비되지 않은 팀 소속 사용자 수 (allReady 계산용)
+        "seq": 0,            # 밴/픽 delta 순번
+        # 브로드캐스트용 status_update 템플릿 (settings/users는 같은 객체를 공유)
+        "status_template": {
+            "type": "status_update",
+            "data": {
+                "gameCode": room_id,
+                "settings": settings_dump,
+                "users": users,
+                "status": "waiting",
+                "currentSet": 1,
+                "allReady": True
+            }
+        },
     }
-    logger.info(f"New room created - ID: {room_id}, Settings: {settings.model_dump()}")  # Updated from dict()
+    # 공개 상태 뷰 (리스트/dict는 방과 같은 객체를 공유하여 복사 없이 최신 상태 유지)
+    room["public"] = {key: room[key] for key in PUBLIC_ROOM_KEYS}
+    logger.info("New room created - ID: %s, Settings: %s", room_id, settings_dump)
     return {"room_id": room_id}
 
 @app.get("/game/{game_code}")
 async def get_game(game_code: str):
     """Get game information for a specific room"""
     if game_code not in rooms:
-        logger.warning(f"Room not found - ID: {game_code}")
+        logger.warning("Room not found - ID: %s", game_code)
         raise HTTPException(status_code=404, detail="Room not found")
     
-    logger.info(f"Room info requested - ID: {game_code}")
-    return rooms[game_code]
+    logger.info("Room info requested - ID: %s", game_code)
+    # 방 상태는 이미 JSON 호환 dict/list이므로 jsonable_encoder를 거치지 않고 orjson으로 바로 직렬화
+    room_data = refresh_public_view(rooms[game_code])
+    return Response(content=orjson.dumps(room_data), media_type="application/json")
 
-@app.get("/game/{game_code}/status", response_model=LobbyStatus)
+@app.get("/game/{game_code}/status", responses={200: {"model": LobbyStatus}})
 async def get_lobby_status(game_code: str):
     """Get detailed lobby status information"""
     if game_code not in rooms:
-        logger.warning(f"Room not found - ID: {game_code}")
+        logger.warning("Room not found - ID: %s", game_code)
         raise HTTPException(status_code=404, detail="Room not found")
     
-    room = rooms[game_code]
-    all_ready = all(user["isReady"] or user["isHost"] for user in room["users"] if user["team"] != "SPECTATOR")
+    # 상태 템플릿은 이미 LobbyStatus 형태이므로 모델 검증 없이 orjson으로 바로 직렬화
+    # (LobbyStatus는 OpenAPI 스키마 문서화에만 사용)
+    status_response = refresh_status_template(rooms[game_code])["data"]
     
-    status_response = LobbyStatus(
-        gameCode=game_code,
-        settings=GameSettings(**room["settings"]),
-        users=room["users"],
-        status=room["status"],
-        currentSet=room["currentSet"],
-        allReady=all_ready
-    )
-    
-    logger.info(f"Lobby status requested - Room: {game_code}, All ready: {all_ready}")
-    return status_response
+    logger.info("Lobby status requested - Room: %s, All ready: %s", game_code, status_response["allReady"])
+    return Response(content=orjson.dumps(status_response), media_type="application/json")
 
 @app.post("/game/{game_code}/result")
 async def submit_game_result(game_code: str, result: GameResult):
@@ -214,12 +599,17 @@ async def submit_game_result(game_code: str, result: GameResult):
         raise HTTPException(status_code=404, detail="Room not found")
     
     room = rooms[game_code]
-    room["results"].append(result.model_dump())
+    result_data = result.model_dump()
+    room["results"].append(result_data)
     room["currentSet"] += 1  # 다음 세트로 이동
-    room["bans"] = []       # 밴 목록 초기화
-    room["picks"] = []      # 픽 목록 초기화
+    room["bans"].clear()    # 밴 목록 초기화 (public 뷰와 같은 리스트를 유지)
+    room["picks"].clear()   # 픽 목록 초기화
+    
+    # 세트 변경을 알려 클라이언트가 밴/픽 목록을 초기화하도록 함
+    schedule_broadcast(game_code)
     
-    logger.info(f"Game result submitted - Room: {game_code}, Set: {room['currentSet']-1}, Result: {result.model_dump()}")
+    logger.info("Game result submitted - Room: %s, Set: %s", game_code, room['currentSet']-1)
+    logger.debug("Game result payload - Room: %s, Result: %s", game_code, result_data)
     return {"status": "success", "currentSet": room["currentSet"]}
 
 @app.post("/game/{game_code}/join")
@@ -229,7 +619,9 @@ async def join_lobby(game_code: str, user_data: dict):
         raise HTTPException(status_code=404, detail="Room not found")
     
     room = rooms[game_code]
-    user_id = str(uuid.uuid4())[:6]
+    user_id = secrets.token_hex(3)
+    while user_id in room["users_by_id"]:  # 같은 방의 기존 사용자와 충돌 방지
+        user_id = secrets.token_hex(3)
     
     new_user = LobbyUser(
         id=user_id,
@@ -240,12 +632,15 @@ async def join_lobby(game_code: str, user_data: dict):
         isHost=len(room["users"]) == 0  # 첫 번째 참가자를 호스트로 지정
     )
     
-    room["users"].append(new_user.model_dump())
-    logger.info(f"User '{new_user.nickname}' joined room {game_code}")
+    user = new_user.model_dump()
+    room["users"].append(user)
+    room["users_by_id"][user_id] = user
+    room["unready_count"] += _is_unready(user)
+    logger.info("User '%s' joined room %s", new_user.nickname, game_code)
     
     # 모든 클라이언트에게 상태 업데이트 전송
-    await broadcast_room_status(game_code)
-    return new_user.model_dump()
+    schedule_broadcast(game_code)
+    return user
 
 @app.patch("/game/{game_code}/user/{user_id}/team")
 async def update_team(game_code: str, user_id: str, team_data: dict):
@@ -254,16 +649,15 @@ async def update_team(game_code: str, user_id: str, team_data: dict):
         raise HTTPException(status_code=404, detail="Room not found")
     
     room = rooms[game_code]
-    user = next((u for u in room["users"] if u["id"] == user_id), None)
+    user = room["users_by_id"].get(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user["team"] = team_data["team"]
-    user["position"] = team_data["position"]
-    logger.info(f"User '{user['nickname']}' moved to team {team_data['team']} at position {team_data['position']} in room {game_code}")
+    update_user(room, user, team=team_data["team"], position=team_data["position"])
+    logger.info("User '%s' moved to team %s at position %s in room %s", user['nickname'], team_data['team'], team_data['position'], game_code)
     
     # 모든 클라이언트에게 상태 업데이트 전송
-    await broadcast_room_status(game_code)
+    schedule_broadcast(game_code)
     return user
 
 @app.patch("/game/{game_code}/user/{user_id}/ready")
@@ -273,16 +667,16 @@ async def update_ready_status(game_code: str, user_id: str, ready_data: dict):
         raise HTTPException(status_code=404, detail="Room not found")
     
     room = rooms[game_code]
-    user = next((u for u in room["users"] if u["id"] == user_id), None)
+    user = room["users_by_id"].get(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user["isReady"] = ready_data["isReady"]
+    update_user(room, user, isReady=ready_data["isReady"])
     ready_status = "ready" if ready_data["isReady"] else "not ready"
-    logger.info(f"User '{user['nickname']}' is now {ready_status} in room {game_code}")
+    logger.info("User '%s' is now %s in room %s", user['nickname'], ready_status, game_code)
     
     # 모든 클라이언트에게 상태 업데이트 전송
-    await broadcast_room_status(game_code)
+    schedule_broadcast(game_code)
     return user
 
 @app.websocket("/ws/draft")
@@ -291,109 +685,166 @@ async def websocket_endpoint(websocket: WebSocket):
     WebSocket 연결을 처리하는 메인 엔드포인트
     
     연결 과정:
-    1. 연결 수락 및 클라이언트 정보 확인
-    2. 방 존재 여부 확인
+    1. 클라이언트 정보 및 방 존재 여부 확인 (실패 시 핸드셰이크 없이 거부)
+    2. 연결 수락
     3. 연결 정보 저장
     4. 상태 변경 처리 및 브로드캐스트
     """
-    await websocket.accept()
     query_params = websocket.query_params
     room_id = query_params.get("id")
     user_id = query_params.get("userId")  # userId를 쿼리 파라미터로 받음
     is_spectator = query_params.get("spectator", "false").lower() == "true"
 
     if not room_id or not user_id or room_id not in rooms:
-        logger.warning(f"Invalid connection attempt - Room: {room_id}, User: {user_id}")
+        logger.warning("Invalid connection attempt - Room: %s, User: %s", room_id, user_id)
         await websocket.close()
         return
 
     room = rooms[room_id]
     
     # Solo mode check
-    if room["settings"]["playerCount"] == PlayerCountType.SOLO:
-        logger.warning(f"Solo mode doesn't support WebSocket connections")
+    if room["is_solo"]:
+        logger.warning("Solo mode doesn't support WebSocket connections")
         await websocket.close()
         return
 
     # Find user in room
-    user = next((u for u in room["users"] if u["id"] == user_id), None)
+    user = room["users_by_id"].get(user_id)
     if not user:
-        logger.warning(f"User {user_id} not found in room {room_id}")
+        logger.warning("User %s not found in room %s", user_id, room_id)
         await websocket.close()
         return
 
     nickname = user["nickname"]
+    compressed = COMPRESSION_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+    await websocket.accept(subprotocol=COMPRESSION_SUBPROTOCOL if compressed else None)
 
     # Register connection info
+    # 다른 역할로 다시 접속한 경우 이전 연결의 역할 정보는 제거
+    # (이전 연결의 drop_client는 새 연결을 건드리지 않으므로 여기서 정리)
+    room["spectators" if not is_spectator else "participants"].pop(user_id, None)
     if not is_spectator:
         room["participants"][user_id] = {
-            "connected_at": datetime.now().isoformat(),
+            "connected_at": now_iso(),
             "client_id": user_id
         }
     else:
         room["spectators"][user_id] = {
-            "connected_at": datetime.now().isoformat(),
+            "connected_at": now_iso(),
             "client_id": user_id
         }
 
-    # Store WebSocket connection
+    # Store WebSocket connection with its send queue and writer task
     if room_id not in connected_clients:
         connected_clients[room_id] = {}
-    connected_clients[room_id][user_id] = websocket
-
-    logger.info(f"User '{nickname}' connected to room {room_id} as {'spectator' if is_spectator else 'participant'}")
+    previous = connected_clients[room_id].get(user_id)
+    if previous:
+        # 이전 연결은 더 이상 메시지를 받지 않으므로 송신 작업과 소켓을 모두 정리
+        previous.writer.cancel()
+        close_websocket_later(previous.websocket, REPLACED_CLIENT_CLOSE_CODE)
+    send_queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+    writer = asyncio.create_task(client_writer(room_id, user_id, websocket, send_queue))
+    connection = ClientConnection(websocket, send_queue, writer, compressed)
+    connected_clients[room_id][user_id] = connection
+
+    # 접속(재접속 포함)한 클라이언트에게 현재 로비 상태와 드래프트 상태를 바로 전송
+    # (다른 사용자가 방 상태를 바꿀 때까지 기다리지 않도록 함)
+    send_to_client(room_id, user_id, connection, orjson.dumps(refresh_status_template(room)).decode())
+    send_to_client(room_id, user_id, connection, draft_snapshot_payload(room))
+
+    logger.info("User '%s' connected to room %s as %s", nickname, room_id, 'spectator' if is_spectator else 'participant')
 
     try:
         while True:
-            data = await websocket.receive_json()
+            try:
+                data = await receive_message(websocket)
+            except orjson.JSONDecodeError as e:
+                logger.warning("Invalid message from '%s' in room %s: %s", nickname, room_id, e)
+                send_to_client(room_id, user_id, connection, _UNKNOWN_ACK_PAYLOAD)
+                continue
+            if not isinstance(data, dict):
+                logger.warning("Invalid message from '%s' in room %s: expected a JSON object", nickname, room_id)
+                send_to_client(room_id, user_id, connection, _UNKNOWN_ACK_PAYLOAD)
+                continue
+            action = data.get("action")
+            # 액션이 실제로 방 상태에 반영되었는지 여부 (확인 응답의 ok)
+            ok = False
             if not is_spectator:
-                action = data.get("action")
-                
                 if action == "update_team":
-                    target_id = data.get("userId")
-                    team_data = data.get("teamData")
-                    target_user = next((u for u in room["users"] if u["id"] == target_id), None)
+                    try:
+                        update_data = _UPDATE_TEAM_ADAPTER.validate_python(data)
+                    except ValidationError as e:
+                        logger.warning("Invalid update_team payload from '%s' in room %s: %s", nickname, room_id, e)
+                        update_data = None
+                    target_user = room["users_by_id"].get(update_data.userId) if update_data else None
                     if target_user:
+                        team_data = update_data.teamData
                         # Update user's team and position
-                        target_user["team"] = team_data["team"]
-                        target_user["position"] = team_data["position"]
-                        logger.info(f"User '{target_user['nickname']}' team updated to {team_data['team']} at position {team_data['position']} in room {room_id}")
-                        await broadcast_room_status(room_id)
+                        update_user(room, target_user, team=team_data.team, position=team_data.position)
+                        logger.info("User '%s' team updated to %s at position %s in room %s", target_user['nickname'], team_data.team, team_data.position, room_id)
+                        schedule_broadcast(room_id)
+                        ok = True
 
                 elif action == "update_ready":
-                    target_id = data.get("userId")
-                    ready_status = data.get("isReady")
-                    target_user = next((u for u in room["users"] if u["id"] == target_id), None)
+                    try:
+                        ready_data = _READY_DATA_ADAPTER.validate_python(data)
+                    except ValidationError as e:
+                        logger.warning("Invalid update_ready payload from '%s' in room %s: %s", nickname, room_id, e)
+                        ready_data = None
+                    target_user = room["users_by_id"].get(ready_data.userId) if ready_data else None
                     if target_user:
                         # Update user's ready status
-                        target_user["isReady"] = ready_status
-                        status_text = "ready" if ready_status else "not ready"
-                        logger.info(f"User '{target_user['nickname']}' is now {status_text} in room {room_id}")
-                        await broadcast_room_status(room_id)
+                        update_user(room, target_user, isReady=ready_data.isReady)
+                        status_text = "ready" if ready_data.isReady else "not ready"
+                        logger.info("User '%s' is now %s in room %s", target_user['nickname'], status_text, room_id)
+                        schedule_broadcast(room_id)
+                        ok = True
 
                 elif action in ["ban", "pick"]:
-                    # ...existing ban/pick handling code...
-                    pass
-
-            # Send safe copy of room data
-            room_data = {k: v for k, v in room.items() if k not in ["spectators", "participants"]}
-            await websocket.send_json(room_data)
+                    try:
+                        draft_data = _DRAFT_ACTION_ADAPTER.validate_python(data)
+                    except ValidationError as e:
+                        logger.warning("Invalid %s payload from '%s' in room %s: %s", action, nickname, room_id, e)
+                        draft_data = None
+                    if draft_data and apply_draft_action(room_id, room, action, draft_data.champion, user_id):
+                        logger.info("Room %s: Champion %s %s by '%s'", room_id, draft_data.champion, "banned" if action == "ban" else "picked", nickname)
+                        ok = True
+                    elif draft_data:
+                        logger.warning("Rejected %s of %s by '%s' in room %s: already taken or limit reached", action, draft_data.champion, nickname, room_id)
+
+            if action == "resync":
+                # 전체 드래프트 상태를 요청한 클라이언트에게만 전송
+                send_to_client(room_id, user_id, connection, draft_snapshot_payload(room))
+                ok = True
+
+            # 메시지 처리 확인 응답 (방 상태는 status_update 브로드캐스트로 전달)
+            # 검증 실패, 관전자의 변경 요청 등으로 반영되지 않은 액션은 ok=false
+            # 브로드캐스트와 순서가 섞이지 않도록 같은 송신 큐를 사용
+            send_to_client(room_id, user_id, connection, ack_payload(action, ok))
 
     except WebSocketDisconnect:
-        # Cleanup connections
-        if room_id in connected_clients and user_id in connected_clients[room_id]:
-            del connected_clients[room_id][user_id]
-            if not connected_clients[room_id]:
-                del connected_clients[room_id]
-
-        # Remove from participants/spectators
-        if is_spectator:
-            room["spectators"].pop(user_id, None)
-        else:
-            room["participants"].pop(user_id, None)
+        logger.info("User '%s' disconnected from room %s", nickname, room_id)
 
-        logger.info(f"User '{nickname}' disconnected from room {room_id}")
-        await broadcast_room_status(room_id)
+    finally:
+        # Cleanup connections and participants/spectators (예상치 못한 예외로 끝난 경우 포함)
+        connection.writer.cancel()
+        drop_client(room_id, user_id, websocket)
+        schedule_broadcast(room_id)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # uvloop/httptools: libuv 기반 이벤트 루프와 C 기반 HTTP 파서 사용
+    # rooms/connected_clients가 프로세스 메모리에 있으므로 워커는 하나만 사용
+    # permessage-deflate 비활성화: 같은 브로드캐스트를 연결마다 다시 압축하지 않도록 함
+    # TLS는 앞단 리버스 프록시(nginx 등)에서 종료하고, 서버는 로컬 주소에서 평문으로 수신
+    # 앱 객체를 직접 전달하여 main 모듈을 다시 import 하지 않도록 함 (로그 리스너/파일 핸들러 중복 방지)
+    uvicorn.run(
+        app,
+        host="127.0.0.1",
+        port=8000,
+        proxy_headers=True,
+        forwarded_allow_ips="127.0.0.1",
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=False,
+    )